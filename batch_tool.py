@@ -0,0 +1,76 @@
+# Batch script for the iMaps pillar elevation tool (tool.py)
+#
+# Runs the tool for several drill site pads / coal seams at the same time,
+# each in its own process.
+#
+# Usage: python batch_tool.py <pad_config.csv> [max_workers]
+#
+# Each row of the pad configuration CSV file holds the inputs for one run
+# of the tool, in the same order as the tool parameters:
+#
+#   out_gdb, pad_num, coal_seam, elev_pts, in_dem, pillars
+#
+# Note: Each process checks out its own Spatial Analyst and Geostatistical
+# Analyst licenses, so max_workers should not exceed the number of licenses
+# available. Runs that write to the same output geodatabase may fail on
+# schema locks - use a separate output geodatabase for each process if so.
+# Each process runs a single pad, so arcpy environment settings from one
+# pad are never carried over to the next.
+#----------------------------------------------------------------------------------#
+# Import system modules
+import csv
+import multiprocessing
+import sys
+import traceback
+
+import arcpy
+
+import tool
+
+# Number of values in each row of the pad configuration file
+num_params = 6
+
+def run_pad_star(pad_config):
+    """Runs the tool for one row of the pad configuration file(pad_config).
+    Returns True if the tool completed successfully.
+    """
+    try:
+        tool.run_pad(*pad_config)
+    except SystemExit:
+        # The tool stops with sys.exit(0) when an error occurs
+        return False
+    except Exception:
+        # Report any other error without stopping the other pads
+        arcpy.AddError(traceback.format_exc())
+        return False
+    return True
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit('Usage: python batch_tool.py <pad_config.csv> [max_workers]')
+    config_file = sys.argv[1]
+    if len(sys.argv) > 2:
+        max_workers = int(sys.argv[2])
+    else:
+        max_workers = multiprocessing.cpu_count()
+
+    # Read the inputs for each pad, skipping blank rows
+    with open(config_file) as f:
+        pad_configs = [[value.strip() for value in row] for row in csv.reader(f) if row]
+
+    # Check every row before starting any pad
+    for row_num, pad_config in enumerate(pad_configs, 1):
+        if len(pad_config) != num_params:
+            sys.exit('Row {} of {} has {} values, expected {}'.format(
+                row_num, config_file, len(pad_config), num_params))
+
+    pool = multiprocessing.Pool(max_workers, maxtasksperchild=1)
+    try:
+        results = pool.map(run_pad_star, pad_configs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    for pad_config, result in zip(pad_configs, results):
+        print('{} {}: {}'.format(pad_config[1], pad_config[2],
+                                 'completed' if result else 'FAILED'))
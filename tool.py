@@ -4,308 +4,565 @@
 # Created by Brandon Dykun - dgjz@iup.edu
 # 7/21/2021
 #
-# Requires ArcGIS Advanced License
+# Requires ArcGIS Basic License or higher
 # Requires Geostatistical Analyst and Spatial Analyst Extensions
 # Created using ArcMap 10.7 and Python version 2.7.15
 #
 # Calculates the approximate elevation for underground coal mine pillars
 # using the following steps:
 #
-#   1. Extract Values to Points (Extracts DEM values to coal elevation point feature class)
-#   2. Inverse Distance Weighted (Interpolates coal working elevations)
-#   3. Raster to Point (Creates point layer from IWD raster)
-#   4. Add Field (for Depth of workings)
-#   5. Update Cursor (Calculates Depth by subtracting coal working elevation from surface elevation)
-#   6. Spatial Join (Joins pillars to the IDW points - the mean elevation for each pillar 
-#       polygon can be found in the 'mean_elev' field)
+#   1. Copy Features (Copies the pillars to the output geodatabase)
+#   2. Select Layer By Location (Selects coal elevation points near enough to the pillars to affect them)
+#   3. Filter (Removes selected points too far from every individual pillar to affect them)
+#   4. Tiles (Groups the pillars into tiles - steps 5 to 7 are run once for each tile)
+#   5. Interpolation (Interpolates coal working elevations over the pillars with EBK,
+#       or IDW for large point sets)
+#   6. Depth (Calculates a Depth raster by subtracting coal working elevation from surface elevation)
+#   7. Zonal Statistics (Averages the interpolated and Depth rasters within each pillar)
+#   8. Extend Table (The mean elevation and depth for each pillar polygon can be found 
+#       in the 'mean_elev' and 'mean_depth_x10' fields - 'mean_depth_x10' is the depth 
+#       times 10 in the DEM's vertical unit, e.g. 1234 = 123.4 ft for a DEM in feet)
+#   9. Delete (Removes the layer and the intermediate datasets from the in_memory workspace,
+#       also when a step fails)
 #
 # Note: The sys.exit(0) method will stop the script if errors occur. However, this
-# method WILL execute subsequent finally blocks to check in Extensions before exiting.
+# method WILL check in Extensions checked out with licensed() before exiting.
 #----------------------------------------------------------------------------------#
 # Import system modules
 import os
 import arcpy 
+import numpy
 import sys
+from contextlib import contextmanager
 
 class LicenseError(Exception):
     """Class to raise custom LicenseError."""
     pass
 
-def create_out_path(file):
-    """Creates proper path to the output geodatabse and
+@contextmanager
+def licensed(ext):
+    """Checks out the specified ArcGIS extension(ext) for the duration
+    of the with block and checks it back in afterwards, even if an error 
+    occurs. Raises LicenseError if the extension is not available.
+    """
+    if arcpy.CheckExtension(ext) != 'Available':
+        raise LicenseError(ext)
+    arcpy.CheckOutExtension(ext)
+    try:
+        yield
+    finally:
+        arcpy.CheckInExtension(ext)
+
+def create_out_path(out_ws, pad_num, coal_seam, file):
+    """Creates proper path to the output workspace(out_ws) and
     proper naming convention for specified file(file).
     """
-    return os.path.join(out_gdb, pad_num + '_' + coal_seam + '_' + file)
-
-#------------------------------------Inputs---------------------------------------#
-# Inputs formatted for use in the tool
-out_gdb = arcpy.GetParameterAsText(0)   # Output Geodatabase
-pad_num = arcpy.GetParameterAsText(1)   # Drill Site Pad Number
-coal_seam = arcpy.GetParameterAsText(2) # Coal Seam Abbreviation
-elev_pts = arcpy.GetParameterAsText(3)  # Coal Mine Elevation Points 
-in_dem = arcpy.GetParameterAsText(4)    # Digital Elevation Model
-pillars = arcpy.GetParameterAsText(5)   # Coal Mine Pillar Polygons
-
-# Inputs formatted to be run while building tool
-# out_gdb = 'C:/Users/Brandon/Desktop/imaps/project_data/CPA_AOI/Test_Outputs.gdb'                        # Output Geodatabase
-# pad_num = 'Pad15A'                                                                                      # Drill Site Pad Number
-# coal_seam = 'UF'                                                                                        # Coal Seam Abbreviation
-# elev_pts = 'C:/Users/Brandon/Desktop/imaps/project_data/CPA_AOI/ConsolGasWellInfo.gdb/Pad15A_Contours'  # Coal Mine Elevation Points                                                              # Pad Number for consistent naming convention
-# in_dem = 'C:/Users/Brandon/Desktop/imaps/project_data/CPA_AOI/ConsolGasWellInfo.gdb/Pad15A_DEM1000ft'   # Digital Elevation Model
-# pillars = 'C:/Users/Brandon/Desktop/imaps/project_data/CPA_AOI/ConsolGasWellInfo.gdb/Pad15A_Pillars'    # Coal Mine Pillar Polygons
-#------------------------------------Inputs---------------------------------------#
-
-
-#----------------------Extract Values to Points-----------------------------------#
-# Name: ExtractValuesToPoints
-# Description: Extracts a cell value from the DEM at each elevation point.
-# This value is shown in the RASTERVALU field of the output point featureclass.
-# Requirements: Spatial Analyst Extension, os module
-
-# Set local variables
-evp_in_pt_features = elev_pts   
-evp_in_raster = in_dem         
-evp_out_pt_features = create_out_path('Extract')                                                   
-evp_interpolate_values = 'INTERPOLATE'
-evp_add_attributes = 'VALUE_ONLY'
-
-try:
-    # Check out the ArcGIS Spatial Analyst extension license
-    if arcpy.CheckExtension('Spatial') == 'Available':
-        arcpy.CheckOutExtension('Spatial')
-    else:
-        # Raise license error if Spatial Analyst extension is not available
-        raise LicenseError
-
-    # Execute ExtractValuesToPoints
-    arcpy.sa.ExtractValuesToPoints(evp_in_pt_features, evp_in_raster, 
-                            evp_out_pt_features, evp_interpolate_values, 
-                            evp_add_attributes)
-    # Add message to results window
-    arcpy.AddMessage('Extract Values to Points completed successfully...')
-
-except LicenseError:
-    # Prints LicenseError
-    arcpy.AddError('*Spatial Analyst License is Unavailable*')
-    # Stop tool execution
-    sys.exit(0)
-
-except arcpy.ExecuteError:
-    # Prints ExecuteError Message
-    arcpy.AddError('Error druing Extract Values to Points')
-    # Stop tool execution
-    sys.exit(0)
-
-finally:    
-    # Check in the ArcGIS Spatial Analyst extension license
-    arcpy.CheckInExtension('Spatial')
-#----------------------Extract Values to Points-----------------------------------#
-
-
-#--------------------------------------IDW-----------------------------------------#
-# Name: InverseDistanceWeighting
-# Description: Interpolates the coal elevation point features onto a 
-# rectangular raster using Inverse Distance Weighting (IDW).
-# Requirements: Geostatistical Analyst Extension, os module
-
-# Set local variables
-idw_in_pt_features = create_out_path('Extract')                       
-idw_z_field = 'ELEVATION'        # Make sure this will always be the same
-idw_out_ga_layer = ''                                                             
-idw_out_raster = create_out_path('IDWElev')                             
-idw_cell_size = ''                                                                  
-idw_power = ''                                                                          
-
-# Set variables for search neighborhood (OPTIONAL)
-# If these are used, the idw_search_neighborhood = '' below 
-# will need commented out
-# idw_maj_semiaxis = ''                          # Find standard settings for these
-# idw_min_semiaxis = ''                                                                           
-# idw_angle = ''                                                                                      
-# idw_max_neighbors = ''                                                                              
-# idw_min_neighbors = ''                                                                              
-# idw_sector_type = ''                                                                      
-# idw_search_neighbourhood = arcpy.SearchNeighborhoodStandard(idw_maj_semiaxis, idw_min_semiaxis,       
-#                                                       idw_angle, idw_max_neighbors,
-#                                                       idw_min_neighbors, idw_sector_type)
-idw_search_neighborhood = ''
-idw_weight_field = ''
-
-try:
-    # Check out the ArcGIS Geostatistical Analyst extension license
-    if arcpy.CheckExtension('GeoStats') == 'Available':
-        arcpy.CheckOutExtension('GeoStats')
-    else:
-        # Raise license error if Geostatistical Analyst extension is not available
-        raise LicenseError
-
-    # Execute IDW
-    arcpy.IDW_ga(idw_in_pt_features, idw_z_field, idw_out_ga_layer,  
-                    idw_out_raster, idw_cell_size, idw_power, 
-                    idw_search_neighborhood, idw_weight_field)    
-    # Add message to results window
-    arcpy.AddMessage('Inverse Distance Weighted completed successfully...')
-
-except LicenseError:
-    # Add LicenseError to results window
-    arcpy.AddError('*Geostatistical Analyst License is Unavailable*')
-    # Stop tool execution
-    sys.exit(0)
-
-except arcpy.ExecuteError:
-    # Prints ExecuteError Message
-    arcpy.AddError('Error during Inverse Distance Weighted')
-    # Stop tool execution
-    sys.exit(0)
-
-finally:    
-    # Checkin the ArcGIS Geostatistical Analyst extension license
-    arcpy.CheckInExtension('GeoStats')
-#--------------------------------------IDW-----------------------------------------#
-
-
-#--------------------------------Raster to Point-----------------------------------#
-# Name: RasterToPoint
-# Description: Converts the IDW raster dataset from the previous step 
-# into point features. A point feature is created for every pixel in the raster.
-# The elevation value for each point can be found in the grid_code field of the 
-# created point feature class.
-# Requirements: os module
-
-# Set local variables
-rtp_in_raster = create_out_path('IDWElev')                              
-rtp_out_pt = create_out_path('IDWElev_Points')                       
-rtp_field = ''                                  # Find out if this needs to be here
-
-try:
-    # Execute RasterToPoint
-    arcpy.RasterToPoint_conversion(rtp_in_raster, rtp_out_pt, rtp_field)
-    # Add message to results window
-    arcpy.AddMessage('Raster to Point completed successfully...')
-
-except arcpy.ExecuteError:
-    # Prints ExecuteError Message
-    arcpy.AddError('Error during Raster to Point')
-    # Stop tool execution
-    sys.exit(0)
-#--------------------------------Raster to Point-----------------------------------#
-
-
-#-----------------------------------Add Field--------------------------------------#
-# Name: AddField
-# Description: Adds a new field named "DEPTH" to the point feature class 
-# created in the Extract Values to Points step
-# Requirements: os module
-
-# Set local variables
-af_in_features = create_out_path('Extract.shp')
-af_field_name = 'DEPTH'
-af_field_type = 'Float'
-af_field_precision = 9
-af_field_scale = 2
-af_field_length = ''
-af_field_alias = ''        
-af_field_is_nullable = 'NULLABLE'
-
-try:
-    # Execute AddField 
-    arcpy.AddField_management(af_in_features, af_field_name, 
-                                af_field_type, af_field_precision, 
-                                af_field_scale , af_field_length, 
-                                af_field_alias, af_field_is_nullable)
-
-except arcpy.ExecuteError:
-    # Prints ExecuteError Message
-    arcpy.AddError('Error during Add Field')
-    # Stop tool execution
-    sys.exit(0)
-#-----------------------------------Add Field--------------------------------------#
-
-
-#---------------------------------Update Cursor------------------------------------#
-# Name: UpdateCursor
-# Description: Calculates a coal depth value (DEPTH) for each point by 
-# subtracting coal elevation (Elevation) from ground elevation (RASTERVALU).
-# Requirements: os module
-
-# Set local variables
-uc_fc = create_out_path('Extract')
-uc_fields = ['DEPTH', 'RASTERVALU', 'ELEVATION']
-
-try:
-    # Create update cursor for feature class 
-    with arcpy.da.UpdateCursor(uc_fc, uc_fields) as cursor:
-        # For each row, calculates the DEPTH value 
-        for row in cursor:
-            row[0] = row[1] - row[2]
-            
-            # Update the cursor with the updated value
-            cursor.updateRow(row)
-
-except arcpy.ExecuteError:
-    # Prints ExecuteError Message
-    arcpy.AddError('Error during Update Cursor')
-    # Stop tool execution
-    sys.exit(0)
-#---------------------------------Update Cursor------------------------------------#
-
-
-#---------------------------------Spatial Join-------------------------------------#
-# Name: SpatialJoin
-# Description: Joins the attributes of IDW Elevation points created in the 
-# Raster to Point step to the pillars shapefile based on spatial relationships.
-# Requirements: os module
-
-# Set local variables
-sj_target_features = pillars    
-sj_join_features = create_out_path('IDWElev_Points')
-sj_outfc = create_out_path('Pillars_SpatialJoinIDW')
-sj_join_operation = 'JOIN_ONE_TO_ONE'
-sj_join_type = "KEEP_ALL"
-
-# Spatial Join Version 1
-# Use this if the field mapping is not necessary
-# try:
-#     #Run the Spatial Join tool, using the defaults 
-#     # for the join operation and join type
-#     arcpy.SpatialJoin_analysis(sj_target_features, sj_join_features, 
-#                                 sj_outfc, sj_join_operation)
-#     # Add message to results window
-#     arcpy.AddMessage('Spatial Join completed successfully...')
-
-# except arcpy.ExecuteError:
-#     # Prints ExecuteError Message
-#     arcpy.AddError('Error during Spatial Join')
-#     # Stop tool execution 
-#     sys.exit(0)
-
-# Spatial Join Version 2
-# Calculates an additional field "mean_elev" which represents the mean elevation
-# of each coal pillar. This is calculated by averaging the elevation values from the 
-# points in the IDW point feature class that intersect with each pillar polygon
-try:
-    arcpy.SpatialJoin_analysis(sj_target_features, sj_join_features, sj_outfc, \
-        sj_join_operation, sj_join_type, "Seam \"Seam\" true true false 50 Text 0 0 ,First,#," \
-        + sj_target_features + ",Seam,-1,-1;CalcElev \"CalcElev\" true true false 4 Float 0 0 ,First,#," \
-        + sj_target_features + ",CalcElev,-1,-1;SHAPE_Length \"SHAPE_Length\" false true true 8 Double 0 0 ,First,#," \
-        + sj_target_features + ",SHAPE_Length,-1,-1;SHAPE_Area \"SHAPE_Area\" false true true 8 Double 0 0 ,First,#," \
-        + sj_target_features + ",SHAPE_Area,-1,-1;Mine \"Mine\" true true false 100 Text 0 0 ,First,#," \
-        + sj_target_features + ",Mine,-1,-1;Operator \"Operator\" true true false 100 Text 0 0 ,First,#," \
-        + sj_target_features + ",Operator,-1,-1;MapRefernce \"MapRefernce\" true true false 100 Text 0 0 ,First,#," \
-        + sj_target_features + ",MapRefernce,-1,-1;USGS_QUAD \"USGS_QUAD\" true true false 50 Text 0 0 ,First,#," \
-        + sj_target_features + ",USGS_QUAD,-1,-1;SqFeet \"SqFeet\" true true false 8 Double 0 0 ,First,#," \
-        + sj_target_features + ",SqFeet,-1,-1;pointid \"pointid\" true true false 4 Long 0 0 ,First,#," \
-        + sj_join_features + ",pointid,-1,-1;grid_code \"grid_code\" true true false 4 Float 0 0 ,First,#," \
-        + sj_join_features + ",grid_code,-1,-1;mean_elev \"mean_elev\" true true false 50 Float 2 7 ,Mean,#," \
-        + sj_join_features + ",grid_code,-1,-1", "INTERSECT", "", "")
-
-    # Add message to results window
-    arcpy.AddMessage('Spatial Join completed successfully...')
-
-except arcpy.ExecuteError:
-    # Prints ExecuteError Message
-    arcpy.AddError('Error during Spatial Join')
-    # Stop tool execution 
-    sys.exit(0)
-
-#---------------------------------Spatial Join-------------------------------------#
\ No newline at end of file
+    return os.path.join(out_ws, pad_num + '_' + coal_seam + '_' + file)
+
+def delete_datasets(datasets):
+    """Deletes each of the specified datasets(datasets) that exists. Only 
+    warns if a dataset cannot be deleted, since the output is not affected.
+    """
+    for dataset in datasets:
+        try:
+            # Execute Delete
+            if arcpy.Exists(dataset):
+                arcpy.Delete_management(dataset)
+
+        except arcpy.ExecuteError:
+            arcpy.AddWarning('Could not delete ' + dataset)
+
+def process_pad(out_gdb, pad_num, coal_seam, elev_pts, in_dem, pillars):
+    """Calculates the mean pillar elevation for a single drill site pad(pad_num)
+    and coal seam(coal_seam). Intermediate datasets are kept in the in_memory
+    workspace and only the pillars with the 'mean_elev' field are written to 
+    the output geodatabase(out_gdb). The Spatial Analyst and Geostatistical 
+    Analyst extensions must already be checked out.
+    """
+    # Workspace for intermediate datasets
+    scratch = 'in_memory'
+
+    # Paths to the datasets and layer created by the tool
+    elev_lyr = pad_num + '_' + coal_seam + '_ElevPts'
+    tile_pts_fc = create_out_path(scratch, pad_num, coal_seam, 'TilePts')
+    idw_ras = create_out_path(scratch, pad_num, coal_seam, 'IDWElev')
+    depth_ras = create_out_path(scratch, pad_num, coal_seam, 'Depth')
+    zonal_tbl = create_out_path(scratch, pad_num, coal_seam, 'ZonalMean')
+    depth_zonal_tbl = create_out_path(scratch, pad_num, coal_seam, 'DepthZonal')
+    out_fc = create_out_path(out_gdb, pad_num, coal_seam, 'Pillars_SpatialJoinIDW')
+
+    #--------------------------------Copy Features-------------------------------------#
+    # Name: CopyFeatures
+    # Description: Copies the pillars to the output geodatabase so the input 
+    # feature class is left unchanged. The later steps read the pillars from 
+    # this copy so their ObjectIDs match the output.
+    # Requirements: os module
+
+    # Set local variables
+    cf_in_features = pillars
+    cf_out_features = out_fc
+
+    try:
+        # Execute CopyFeatures
+        arcpy.CopyFeatures_management(cf_in_features, cf_out_features)
+        # Add message to results window
+        arcpy.AddMessage('Copy Features completed successfully...')
+
+    except arcpy.ExecuteError:
+        # Prints ExecuteError Message
+        arcpy.AddError('Error during Copy Features')
+        # Stop tool execution
+        sys.exit(0)
+    #--------------------------------Copy Features-------------------------------------#
+
+
+    # The Delete step runs in the finally block, so the Extent environment set 
+    # for the tiles is reset and the layer and intermediate datasets are removed 
+    # even if a step stops the tool with sys.exit(0)
+    try:
+        #----------------------------Select Layer By Location------------------------------#
+        # Name: SelectLayerByLocation
+        # Description: Selects the coal elevation points within the extent of the 
+        # pillars, expanded by the interpolation search radius. Points farther than 
+        # the search radius from every pillar are only used by the interpolation where 
+        # fewer than the minimum number of neighbors fall within the search radius of 
+        # a cell, so leaving them out can change the result where the points are sparse. 
+        # The points are selected on a layer instead of being copied, so none of their 
+        # attribute fields are copied for the later steps, which only use ELEVATION.
+        # Requirements: numpy module, os module
+
+        # Set local variables
+        sel_in_features = elev_pts
+        sel_in_pillars = out_fc
+        sel_out_layer = elev_lyr
+        sel_overlap_type = 'INTERSECT'
+        sel_elev_desc = arcpy.Describe(sel_in_features)
+        sel_spatial_ref = sel_elev_desc.spatialReference
+        sel_elev_extent = sel_elev_desc.extent
+        sel_search_radius = (sel_elev_extent.width ** 2 + sel_elev_extent.height ** 2) ** 0.5 / 10
+
+        # The search radius and the Filter grid are sized from the extent of the 
+        # elevation points, so they must cover an area (this also stops on NaN)
+        if not sel_search_radius > 0:
+            arcpy.AddError('Error during Select Layer By Location: the elevation points ' + 
+                            'must not all be at the same location')
+            # Stop tool execution
+            sys.exit(0)
+
+        try:
+            # Read the bounding box and area of each pillar in the elevation points' 
+            # coordinate system, so the search radius is added in the same units
+            with arcpy.da.SearchCursor(sel_in_pillars, ['OID@', 'SHAPE@'], 
+                                        spatial_reference=sel_spatial_ref) as cursor:
+                pillar_bboxes = numpy.fromiter(
+                    ((row[0], row[1].extent.XMin, row[1].extent.YMin, 
+                      row[1].extent.XMax, row[1].extent.YMax, row[1].area) for row in cursor if row[1]),
+                    dtype=[('oid', numpy.int32), ('xmin', numpy.float64), ('ymin', numpy.float64),
+                           ('xmax', numpy.float64), ('ymax', numpy.float64), ('area', numpy.float64)])
+            # The envelope, the Filter grid and the tile size are sized from the pillars, 
+            # so stop if there are none or none of them has an area (the sum is 0 if empty)
+            if not pillar_bboxes['area'].sum() > 0:
+                arcpy.AddError('Error during Select Layer By Location: there are no pillars ' + 
+                                'with an area')
+                # Stop tool execution
+                sys.exit(0)
+
+            sel_xmin = pillar_bboxes['xmin'].min() - sel_search_radius
+            sel_ymin = pillar_bboxes['ymin'].min() - sel_search_radius
+            sel_xmax = pillar_bboxes['xmax'].max() + sel_search_radius
+            sel_ymax = pillar_bboxes['ymax'].max() + sel_search_radius
+            sel_select_features = arcpy.Polygon(arcpy.Array([
+                arcpy.Point(sel_xmin, sel_ymin), arcpy.Point(sel_xmax, sel_ymin),
+                arcpy.Point(sel_xmax, sel_ymax), arcpy.Point(sel_xmin, sel_ymax)]),
+                sel_spatial_ref)
+
+            # Execute MakeFeatureLayer and SelectLayerByLocation
+            arcpy.MakeFeatureLayer_management(sel_in_features, sel_out_layer)
+            arcpy.SelectLayerByLocation_management(sel_out_layer, sel_overlap_type, 
+                                                    sel_select_features)
+            # Add message to results window
+            arcpy.AddMessage('Select Layer By Location completed successfully...')
+
+        except (arcpy.ExecuteError, RuntimeError):
+            # Prints ExecuteError Message
+            arcpy.AddError('Error during Select Layer By Location')
+            # Stop tool execution
+            sys.exit(0)
+        #----------------------------Select Layer By Location------------------------------#
+
+
+        #-----------------------------------Filter-----------------------------------------#
+        # Name: Filter
+        # Description: Removes the selected elevation points that are farther than the 
+        # search radius from the bounding box of every pillar. The pillar bounding 
+        # boxes read by Select Layer By Location are marked on a grid, so each point 
+        # is checked with a single grid lookup instead of against every pillar. The 
+        # remaining points are kept in an array for the tiles below.
+        # Requirements: numpy module
+
+        # Set local variables
+        ft_in_features = elev_lyr
+        ft_z_field = 'ELEVATION'
+        ft_spatial_ref = sel_spatial_ref
+        ft_search_radius = sel_search_radius
+        ft_cell_size = sel_search_radius / 4
+
+        try:
+            # Mark every grid cell within the search radius of a pillar bounding box
+            ft_x_origin = pillar_bboxes['xmin'].min() - ft_search_radius
+            ft_y_origin = pillar_bboxes['ymin'].min() - ft_search_radius
+            ft_cols = int((pillar_bboxes['xmax'].max() + ft_search_radius - ft_x_origin) / ft_cell_size) + 1
+            ft_rows = int((pillar_bboxes['ymax'].max() + ft_search_radius - ft_y_origin) / ft_cell_size) + 1
+            ft_grid = numpy.zeros((ft_rows, ft_cols), dtype=bool)
+            ft_col_min = ((pillar_bboxes['xmin'] - ft_search_radius - ft_x_origin) / ft_cell_size).astype(int)
+            ft_col_max = ((pillar_bboxes['xmax'] + ft_search_radius - ft_x_origin) / ft_cell_size).astype(int)
+            ft_row_min = ((pillar_bboxes['ymin'] - ft_search_radius - ft_y_origin) / ft_cell_size).astype(int)
+            ft_row_max = ((pillar_bboxes['ymax'] + ft_search_radius - ft_y_origin) / ft_cell_size).astype(int)
+            for col_min, col_max, row_min, row_max in zip(ft_col_min, ft_col_max, ft_row_min, ft_row_max):
+                ft_grid[row_min:row_max + 1, col_min:col_max + 1] = True
+
+            # Look up the grid cell of each point
+            ft_pts = arcpy.da.FeatureClassToNumPyArray(ft_in_features, ['SHAPE@XY', ft_z_field], 
+                                                        skip_nulls=True)
+            ft_pt_cols = numpy.floor((ft_pts['SHAPE@XY'][:, 0] - ft_x_origin) / ft_cell_size).astype(int)
+            ft_pt_rows = numpy.floor((ft_pts['SHAPE@XY'][:, 1] - ft_y_origin) / ft_cell_size).astype(int)
+            ft_on_grid = ((ft_pt_cols >= 0) & (ft_pt_cols < ft_cols) & 
+                          (ft_pt_rows >= 0) & (ft_pt_rows < ft_rows))
+            ft_keep = numpy.zeros(ft_pts.shape, dtype=bool)
+            ft_keep[ft_on_grid] = ft_grid[ft_pt_rows[ft_on_grid], ft_pt_cols[ft_on_grid]]
+
+            # Keep the remaining points
+            filtered_pts = numpy.empty(numpy.count_nonzero(ft_keep), 
+                                       dtype=[('XY', numpy.float64, 2), 
+                                              (ft_z_field, ft_pts.dtype[ft_z_field])])
+            filtered_pts['XY'] = ft_pts['SHAPE@XY'][ft_keep]
+            filtered_pts[ft_z_field] = ft_pts[ft_z_field][ft_keep]
+            # Add message to results window
+            arcpy.AddMessage('Filter completed successfully...')
+
+        except (arcpy.ExecuteError, RuntimeError):
+            # Prints ExecuteError Message
+            arcpy.AddError('Error during Filter')
+            # Stop tool execution
+            sys.exit(0)
+        #-----------------------------------Filter-----------------------------------------#
+
+
+        #------------------------------------Tiles-----------------------------------------#
+        # Name: Tiles
+        # Description: Groups the pillars into square tiles by the center of their 
+        # bounding box. Interpolation, Depth and Zonal Statistics are run one tile at 
+        # a time over the bounding box of the tile's pillars, so the size of the 
+        # intermediate rasters depends on the tile size rather than on the extent of 
+        # all the pillars, and empty areas between groups of pillars are skipped.
+        # Requirements: numpy module
+
+        # Set local variables
+        # A cell a quarter of the width of an average pillar gives each pillar 
+        # about 16 cells, which is enough for its mean without oversampling
+        tl_cell_size = numpy.sqrt(pillar_bboxes['area'].mean()) / 4
+        tl_max_cells = 2000             # Tile width in cells
+        tl_size = tl_cell_size * tl_max_cells
+        # The interpolation method is chosen once for the pad from all of the 
+        # filtered points, so every tile uses the same method
+        tl_ebk_max_points = 5000        # Use IDW above this many points
+        tl_use_ebk = filtered_pts.size <= tl_ebk_max_points
+
+        # Assign each pillar to a tile
+        tl_x_center = (pillar_bboxes['xmin'] + pillar_bboxes['xmax']) / 2
+        tl_y_center = (pillar_bboxes['ymin'] + pillar_bboxes['ymax']) / 2
+        tl_cols = numpy.floor((tl_x_center - tl_x_center.min()) / tl_size).astype(int)
+        tl_rows = numpy.floor((tl_y_center - tl_y_center.min()) / tl_size).astype(int)
+        tl_keys = tl_rows * (tl_cols.max() + 1) + tl_cols
+        tl_tiles = [numpy.flatnonzero(tl_keys == key) for key in numpy.unique(tl_keys)]
+
+        # Per-pillar means collected from every tile, by output field
+        tile_means = {}
+
+        for tl_num, tl_pillars in enumerate(tl_tiles):
+            arcpy.AddMessage('Processing tile {} of {}...'.format(tl_num + 1, len(tl_tiles)))
+
+            # Bounding box of the pillars in this tile
+            tl_bboxes = pillar_bboxes[tl_pillars]
+            tl_extent = arcpy.Extent(tl_bboxes['xmin'].min(), tl_bboxes['ymin'].min(), 
+                                     tl_bboxes['xmax'].max(), tl_bboxes['ymax'].max())
+            arcpy.env.extent = tl_extent
+
+            #---------------------------------Interpolation------------------------------------#
+            # Name: EmpiricalBayesianKriging / InverseDistanceWeighting
+            # Description: Interpolates the coal elevation point features onto a 
+            # rectangular raster. Empirical Bayesian Kriging (EBK) gives a smoother 
+            # surface than IDW for sparse contour points, so it is used unless the pad 
+            # has too many points for it to finish in a reasonable time, in which case 
+            # Inverse Distance Weighting (IDW) is used for every tile instead. Only the 
+            # filtered points within the search radius of the tile are used.
+            # Requirements: Geostatistical Analyst Extension, numpy module, os module
+
+            # Set local variables
+            idw_in_pt_features = tile_pts_fc
+            idw_z_field = 'ELEVATION'        # Make sure this will always be the same
+            idw_out_ga_layer = ''                                                             
+            idw_out_raster = idw_ras
+            idw_cell_size = tl_cell_size
+            idw_power = 2
+
+            # Set variables for search neighborhood
+            # A local neighborhood limits each cell to its nearest points instead of 
+            # weighting every point, which is much faster for large point sets. Points 
+            # beyond the search radius have a weight close to zero when power >= 2.
+            idw_maj_semiaxis = sel_search_radius
+            idw_min_semiaxis = sel_search_radius
+            idw_angle = 0
+            idw_max_neighbors = 12
+            idw_min_neighbors = 6
+            idw_sector_type = 'FOUR_SECTORS'
+            idw_search_neighborhood = arcpy.SearchNeighborhoodStandard(idw_maj_semiaxis, idw_min_semiaxis,
+                                                                    idw_angle, idw_max_neighbors,
+                                                                    idw_min_neighbors, idw_sector_type)
+            idw_weight_field = ''
+
+            # Set variables for EBK
+            ebk_transformation_type = 'NONE'
+            ebk_max_local_points = 100
+            ebk_overlap_factor = 1
+            ebk_number_semivariograms = 50
+            ebk_smoothing_factor = 0.2
+            ebk_search_neighborhood = arcpy.SearchNeighborhoodSmoothCircular(sel_search_radius, 
+                                                                            ebk_smoothing_factor)
+            ebk_output_type = 'PREDICTION'
+
+            # Points within the search radius of the tile, or every filtered point 
+            # if there are too few near the tile to interpolate it
+            idw_xy = filtered_pts['XY']
+            idw_tile_pts = filtered_pts[(idw_xy[:, 0] >= tl_extent.XMin - sel_search_radius) & 
+                                        (idw_xy[:, 0] <= tl_extent.XMax + sel_search_radius) & 
+                                        (idw_xy[:, 1] >= tl_extent.YMin - sel_search_radius) & 
+                                        (idw_xy[:, 1] <= tl_extent.YMax + sel_search_radius)]
+            if idw_tile_pts.size < idw_min_neighbors:
+                idw_tile_pts = filtered_pts
+
+            try:
+                arcpy.da.NumPyArrayToFeatureClass(idw_tile_pts, idw_in_pt_features, ['XY'], 
+                                                  ft_spatial_ref)
+                if tl_use_ebk:
+                    # Execute EBK
+                    arcpy.EmpiricalBayesianKriging_ga(idw_in_pt_features, idw_z_field, idw_out_ga_layer, 
+                                                    idw_out_raster, idw_cell_size, 
+                                                    ebk_transformation_type, ebk_max_local_points, 
+                                                    ebk_overlap_factor, ebk_number_semivariograms, 
+                                                    ebk_search_neighborhood, ebk_output_type)
+                    # Add message to results window
+                    arcpy.AddMessage('Empirical Bayesian Kriging completed successfully...')
+                else:
+                    # Execute IDW
+                    arcpy.IDW_ga(idw_in_pt_features, idw_z_field, idw_out_ga_layer,  
+                                    idw_out_raster, idw_cell_size, idw_power, 
+                                    idw_search_neighborhood, idw_weight_field)    
+                    # Add message to results window
+                    arcpy.AddMessage('Inverse Distance Weighted completed successfully...')
+
+            except (arcpy.ExecuteError, RuntimeError):
+                # Prints ExecuteError Message
+                arcpy.AddError('Error during Interpolation')
+                # Stop tool execution
+                sys.exit(0)
+            #---------------------------------Interpolation------------------------------------#
+
+
+            #------------------------------------Depth-----------------------------------------#
+            # Name: Minus
+            # Description: Calculates a coal depth raster by subtracting the interpolated 
+            # coal elevation raster from the ground elevation raster (DEM). The DEM is 
+            # read with a single nearest cell lookup per output cell; no bilinear 
+            # interpolation of the DEM is done anywhere in the tool. The output is 
+            # on the cell size and grid of the interpolated raster, so the mean depth 
+            # and the mean elevation of a pillar are taken over the same cells.
+            # Requirements: Spatial Analyst Extension, os module
+
+            # Set local variables
+            dp_in_raster1 = in_dem
+            dp_in_raster2 = idw_ras
+            dp_out_raster = depth_ras
+
+            try:
+                # Use the interpolated raster's cells instead of the DEM's
+                arcpy.env.cellSize = dp_in_raster2
+                arcpy.env.snapRaster = dp_in_raster2
+                # Execute Minus
+                arcpy.sa.Minus(dp_in_raster1, arcpy.Raster(dp_in_raster2)).save(dp_out_raster)
+                # Add message to results window
+                arcpy.AddMessage('Depth completed successfully...')
+
+            except (arcpy.ExecuteError, RuntimeError):
+                # Prints ExecuteError Message
+                arcpy.AddError('Error during Depth')
+                # Stop tool execution
+                sys.exit(0)
+            #------------------------------------Depth-----------------------------------------#
+
+
+            #-------------------------------Zonal Statistics-----------------------------------#
+            # Name: ZonalStatisticsAsTable
+            # Description: Calculates the mean of the interpolated and Depth raster cells 
+            # that fall within each pillar polygon of the tile. Pillars from other tiles 
+            # that reach into the tile extent are left for their own tile.
+            # Requirements: Spatial Analyst Extension, numpy module, os module
+
+            # Set local variables
+            zs_in_pillars = out_fc
+            zs_zone_field = arcpy.Describe(zs_in_pillars).OIDFieldName
+            zs_ignore_nodata = 'DATA'
+            zs_statistics_type = 'MEAN'
+            # Value raster, output table and output field for each mean
+            zs_stats = [(idw_ras, zonal_tbl, 'mean_elev'),
+                        (depth_ras, depth_zonal_tbl, 'mean_depth_x10')]
+
+            try:
+                for zs_in_raster, zs_out_table, zs_out_field in zs_stats:
+                    # Execute ZonalStatisticsAsTable
+                    arcpy.sa.ZonalStatisticsAsTable(zs_in_pillars, zs_zone_field, zs_in_raster, 
+                                                    zs_out_table, zs_ignore_nodata, 
+                                                    zs_statistics_type)
+
+                    # Read the mean for each pillar (the zone field is renamed 
+                    # in the output table because it clashes with the table's ObjectID)
+                    zs_arr = arcpy.da.TableToNumPyArray(zs_out_table, [zs_zone_field + '_1', 
+                                                                        zs_statistics_type])
+                    zs_arr = zs_arr[numpy.in1d(zs_arr[zs_zone_field + '_1'], tl_bboxes['oid'])]
+                    tile_means.setdefault(zs_out_field, []).append(
+                        (zs_arr[zs_zone_field + '_1'], zs_arr[zs_statistics_type]))
+                # Add message to results window
+                arcpy.AddMessage('Zonal Statistics completed successfully...')
+
+            except (arcpy.ExecuteError, RuntimeError):
+                # Prints ExecuteError Message
+                arcpy.AddError('Error during Zonal Statistics')
+                # Stop tool execution 
+                sys.exit(0)
+            #-------------------------------Zonal Statistics-----------------------------------#
+
+            # Delete this tile's intermediate datasets before the next tile, 
+            # and stop using the interpolated raster's cells
+            arcpy.env.cellSize = None
+            arcpy.env.snapRaster = None
+            delete_datasets([tile_pts_fc, idw_ras, depth_ras, zonal_tbl, depth_zonal_tbl])
+
+        #------------------------------------Tiles-----------------------------------------#
+
+
+        #--------------------------------Extend Table--------------------------------------#
+        # Name: ExtendTable
+        # Description: Writes the mean elevation and mean depth of each pillar to the 
+        # 'mean_elev' and 'mean_depth_x10' fields of the output. The depth is stored 
+        # as a short integer in tenths of the DEM's vertical unit (the depth times 10, 
+        # as the field name says), which is half the size of a float field and keeps 
+        # a tenth of a foot or of a metre, more than the interpolation can resolve.
+        # Requirements: numpy module
+
+        # Set local variables
+        et_in_table = out_fc
+        et_oid_field = arcpy.Describe(et_in_table).OIDFieldName
+        # Output field, field type and scale for each mean
+        et_fields = [('mean_elev', numpy.float32, 1),
+                     ('mean_depth_x10', numpy.int16, 10)]
+
+        try:
+            # Convert every mean before writing any of them, so a bad value 
+            # cannot leave the output with only some of the fields
+            et_outs = []
+            for et_out_field, et_field_type, et_scale in et_fields:
+                et_oids = numpy.concatenate([oids for oids, means in tile_means[et_out_field]])
+                et_values = numpy.concatenate([means for oids, means in tile_means[et_out_field]]) * et_scale
+                if numpy.issubdtype(et_field_type, numpy.integer):
+                    # Round instead of truncating, and leave the pillars whose 
+                    # value does not fit in the field out of the table, so 
+                    # ExtendTable leaves them NULL instead of overflowing
+                    et_values = numpy.round(et_values)
+                    et_type_info = numpy.iinfo(et_field_type)
+                    et_in_range = (numpy.isfinite(et_values) & 
+                                   (et_values >= et_type_info.min) & 
+                                   (et_values <= et_type_info.max))
+                    if not et_in_range.all():
+                        arcpy.AddWarning('{} pillar(s) have a {} too large for its field and are left NULL'
+                                         .format(numpy.count_nonzero(~et_in_range), et_out_field))
+                        et_oids = et_oids[et_in_range]
+                        et_values = et_values[et_in_range]
+                et_out = numpy.empty(et_oids.shape, dtype=[('ET_OID', numpy.int32), 
+                                                           (et_out_field, et_field_type)])
+                et_out['ET_OID'] = et_oids
+                et_out[et_out_field] = et_values
+                et_outs.append(et_out)
+
+            for et_out in et_outs:
+                # Add the mean field to the pillars and write the means in one pass
+                arcpy.da.ExtendTable(et_in_table, et_oid_field, et_out, 'ET_OID')
+            # Add message to results window
+            arcpy.AddMessage('Extend Table completed successfully...')
+
+        except (arcpy.ExecuteError, RuntimeError):
+            # Prints ExecuteError Message
+            arcpy.AddError('Error during Extend Table')
+            # Stop tool execution 
+            sys.exit(0)
+        #--------------------------------Extend Table--------------------------------------#
+
+    finally:
+        #------------------------------------Delete----------------------------------------#
+        # Name: Delete
+        # Description: Resets the Extent, Cell Size and Snap Raster environments and 
+        # deletes the elevation points layer and any intermediate datasets left in 
+        # the in_memory workspace. Only the datasets created by this run are deleted, 
+        # so other in_memory data in the ArcMap session is left alone.
+        # Requirements: os module
+
+        # Set local variables
+        del_datasets = [elev_lyr, tile_pts_fc, idw_ras, depth_ras, zonal_tbl, depth_zonal_tbl]
+
+        arcpy.env.extent = None
+        arcpy.env.cellSize = None
+        arcpy.env.snapRaster = None
+        delete_datasets(del_datasets)
+        #------------------------------------Delete----------------------------------------#
+
+
+def run_pad(out_gdb, pad_num, coal_seam, elev_pts, in_dem, pillars):
+    """Checks out the Spatial Analyst and Geostatistical Analyst extensions
+    and runs the tool for a single drill site pad(pad_num) and coal seam(coal_seam).
+    Both licenses are checked before any processing starts, so a missing 
+    license stops the tool before any time is spent on the earlier steps.
+    """
+    # Extension names used in the license error messages
+    ext_names = {'Spatial': 'Spatial Analyst', 'GeoStats': 'Geostatistical Analyst'}
+
+    try:
+        # Check out both extensions once for the whole tool
+        with licensed('Spatial'), licensed('GeoStats'):
+            process_pad(out_gdb, pad_num, coal_seam, elev_pts, in_dem, pillars)
+
+    except LicenseError as e:
+        # Prints LicenseError
+        arcpy.AddError('*' + ext_names[e.args[0]] + ' License is Unavailable*')
+        # Stop tool execution
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    #------------------------------------Inputs---------------------------------------#
+    # Inputs formatted for use in the tool
+    out_gdb = arcpy.GetParameterAsText(0)   # Output Geodatabase
+    pad_num = arcpy.GetParameterAsText(1)   # Drill Site Pad Number
+    coal_seam = arcpy.GetParameterAsText(2) # Coal Seam Abbreviation
+    elev_pts = arcpy.GetParameterAsText(3)  # Coal Mine Elevation Points 
+    in_dem = arcpy.GetParameterAsText(4)    # Digital Elevation Model
+    pillars = arcpy.GetParameterAsText(5)   # Coal Mine Pillar Polygons
+
+    # Inputs formatted to be run while building tool
+    # out_gdb = 'C:/Users/Brandon/Desktop/imaps/project_data/CPA_AOI/Test_Outputs.gdb'                        # Output Geodatabase
+    # pad_num = 'Pad15A'                                                                                      # Drill Site Pad Number
+    # coal_seam = 'UF'                                                                                        # Coal Seam Abbreviation
+    # elev_pts = 'C:/Users/Brandon/Desktop/imaps/project_data/CPA_AOI/ConsolGasWellInfo.gdb/Pad15A_Contours'  # Coal Mine Elevation Points                                                              # Pad Number for consistent naming convention
+    # in_dem = 'C:/Users/Brandon/Desktop/imaps/project_data/CPA_AOI/ConsolGasWellInfo.gdb/Pad15A_DEM1000ft'   # Digital Elevation Model
+    # pillars = 'C:/Users/Brandon/Desktop/imaps/project_data/CPA_AOI/ConsolGasWellInfo.gdb/Pad15A_Pillars'    # Coal Mine Pillar Polygons
+    #------------------------------------Inputs---------------------------------------#
+
+    run_pad(out_gdb, pad_num, coal_seam, elev_pts, in_dem, pillars)